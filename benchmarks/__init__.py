@@ -0,0 +1,25 @@
+"""
+Performance benchmarks for the Velocity remittance app.
+
+Each module is runnable from the repository root, e.g. ``python -m benchmarks.render``,
+and prints its results as JSON.
+"""
+import importlib
+import os
+import tempfile
+
+
+def load_app(workdir=None, config=None):
+    """
+    Imports the app module and builds a migrated app whose database (remit.db, relative to
+    the working directory) lives in `workdir`, or in a fresh temporary directory, so
+    benchmarks never touch real data. Returns (module, app).
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="velocity-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    velocity = importlib.import_module("app")
+    app = velocity.create_app(config)
+    with app.app_context():
+        velocity.run_migrations()
+    return velocity, app
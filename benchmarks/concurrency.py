@@ -0,0 +1,107 @@
+"""
+Concurrency check: dashboard reads running alongside remittance inserts must not fail.
+
+Runs reader threads fetching the dashboard and writer threads posting remittances to
+/api/v1/remittances against one scratch database, each thread on its own pooled
+connection. The API answers non-2xx when an insert fails (where the form would flash
+the error and redirect), so every failure is counted. The run exits non-zero if any
+request failed, saw "database is locked", or if the ledger does not hold every
+acknowledged insert.
+
+    python -m benchmarks.concurrency --readers 4 --writers 4 --inserts 200 --batch 1
+"""
+import argparse
+import json
+import threading
+import time
+
+from benchmarks import load_app
+from benchmarks.ledger import seed_ledger
+from benchmarks.loadtest import CREDENTIALS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=5000, help="Ledger size to seed.")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--inserts", type=int, default=200, help="Insert requests per writer.")
+    parser.add_argument("--batch", type=int, default=1, help="Remittances per insert request.")
+    parser.add_argument("--workdir", help="Directory for the scratch remit.db (default: a new temporary directory).")
+    args = parser.parse_args()
+
+    # Every dashboard read runs its queries instead of coming from the page cache
+    velocity, app = load_app(args.workdir, {"DASHBOARD_CACHE_SIZE": 0})
+    db = app.extensions["velocity"].pool.connect()
+    seed_ledger(db, args.rows)
+    before = db.execute("SELECT COUNT(*) FROM remittances").fetchone()[0]
+    db.close()
+
+    writers_done = threading.Event()
+    lock = threading.Lock()
+    reads, inserted, errors = [0], [0], []
+
+    def client():
+        c = app.test_client()
+        c.post("/login", data=CREDENTIALS)
+        return c
+
+    def reader():
+        c = client()
+        while not writers_done.is_set():
+            response = c.get("/")
+            body = response.get_data(as_text=True)
+            with lock:
+                reads[0] += 1
+                if response.status_code != 200 or "database is locked" in body:
+                    errors.append({"route": "GET /", "status": response.status_code,
+                                   "locked": "database is locked" in body})
+
+    def writer(worker_id):
+        c = client()
+        for i in range(args.inserts):
+            batch = [{"sender": f"Writer {worker_id}", "recipient": f"Recipient {i}",
+                      "amount": 100.0 + i, "fee": 2.5, "date": "2025-01-01"}] * args.batch
+            response = c.post("/api/v1/remittances", json=batch)
+            body = response.get_data(as_text=True)
+            with lock:
+                if response.status_code == 201:
+                    inserted[0] += args.batch
+                else:
+                    errors.append({"route": "POST /api/v1/remittances", "status": response.status_code,
+                                   "locked": "database is locked" in body, "body": body[:200]})
+
+    readers = [threading.Thread(target=reader) for _ in range(args.readers)]
+    writers = [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+    start = time.perf_counter()
+    for t in readers + writers:
+        t.start()
+    for t in writers:
+        t.join()
+    writers_done.set()
+    for t in readers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    db = app.extensions["velocity"].pool.connect()
+    after = db.execute("SELECT COUNT(*) FROM remittances").fetchone()[0]
+    db.close()
+    results = {
+        "benchmark": "concurrency",
+        "readers": args.readers,
+        "writers": args.writers,
+        "seconds": round(elapsed, 2),
+        "reads": reads[0],
+        "inserted": inserted[0],
+        "rows_added": after - before,
+        "errors": len(errors),
+        "locked_errors": sum(error["locked"] for error in errors),
+        "first_errors": errors[:5],
+    }
+    print(json.dumps(results, indent=2))
+    if errors or after - before != inserted[0]:
+        raise SystemExit("concurrent reads and inserts did not all succeed")
+
+
+if __name__ == "__main__":
+    main()
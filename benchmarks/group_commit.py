@@ -0,0 +1,87 @@
+"""
+Insert throughput: one commit per remittance versus the group-commit writer.
+
+Runs the same number of single-row inserts from several threads against a scratch
+database, first committing each row on its own pooled connection (the default form path),
+then through GroupCommitWriter. Both paths use the same synchronous level.
+
+    python -m benchmarks.group_commit --threads 8 --rows 500 --synchronous FULL
+"""
+import argparse
+import json
+import threading
+import time
+
+from benchmarks import load_app
+
+
+def run_threads(threads, rows, insert_one):
+    """Runs `threads` workers each inserting `rows` rows; returns elapsed seconds."""
+    def worker(worker_id):
+        for i in range(rows):
+            insert_one((f"Sender {worker_id}", f"Recipient {i}", 100.0 + i, 2.5, "2025-01-01"))
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - start
+
+
+def per_row_commit(velocity, pool, synchronous):
+    """Builds an insert function that commits every row, like the form path."""
+    local = threading.local()
+
+    def insert_one(row):
+        db = getattr(local, "db", None)
+        if db is None:
+            db = local.db = pool.connect()
+            db.execute(f"PRAGMA synchronous = {synchronous}")
+        with db:
+            db.execute(velocity.INSERT_REMITTANCE_SQL, row)
+    return insert_one
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=500, help="Inserts per thread.")
+    parser.add_argument("--batch-size", type=int, help="Default: the app's WRITE_BATCH_SIZE.")
+    parser.add_argument("--delay-ms", type=float, help="Default: the app's WRITE_BATCH_DELAY_MS.")
+    parser.add_argument("--synchronous", choices=("NORMAL", "FULL"), default="FULL")
+    parser.add_argument("--workdir", help="Directory for the scratch remit.db (default: a new temporary directory).")
+    args = parser.parse_args()
+    total = args.threads * args.rows
+
+    velocity, app = load_app(args.workdir)
+    pool = app.extensions["velocity"].pool
+    if args.batch_size is None:
+        args.batch_size = app.config["WRITE_BATCH_SIZE"]
+    if args.delay_ms is None:
+        args.delay_ms = app.config["WRITE_BATCH_DELAY_MS"]
+
+    per_row_s = run_threads(args.threads, args.rows, per_row_commit(velocity, pool, args.synchronous))
+
+    writer = velocity.GroupCommitWriter(pool, args.batch_size, args.delay_ms)
+    if args.synchronous != "FULL":
+        print("note: the group-commit writer always commits with synchronous=FULL")
+    group_s = run_threads(args.threads, args.rows, lambda row: writer.insert([row]))
+    writer.stop()
+
+    print(json.dumps({
+        "benchmark": "group_commit",
+        "threads": args.threads,
+        "inserts": total,
+        "synchronous": args.synchronous,
+        "batch_size": args.batch_size,
+        "delay_ms": args.delay_ms,
+        "per_row_commit_rows_per_s": round(total / per_row_s),
+        "group_commit_rows_per_s": round(total / group_s),
+        "speedup": round(per_row_s / group_s, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Dashboard latency while full-ledger exports run: inside requests versus as background jobs.
+
+Seeds a scratch ledger, then for each mode runs reader threads fetching the dashboard
+through the test client while exporter threads keep producing full CSV exports, either
+by downloading /export (the export holds a request for its whole duration) or by
+submitting export jobs to /api/v1/jobs and polling them until their result is ready.
+A run with no exporters gives the baseline.
+
+    python -m benchmarks.jobs --rows 100000 --readers 2 --exporters 1 --seconds 10
+"""
+import argparse
+import json
+import threading
+import time
+
+from benchmarks import load_app
+from benchmarks.ledger import seed_ledger
+from benchmarks.loadtest import CREDENTIALS, percentile
+
+
+def export_inline(client):
+    """One full export downloaded through /export; returns True on success."""
+    response = client.get("/export?format=csv")
+    response.get_data()  # the export streams; reading it runs the whole export in this request
+    return response.status_code == 200
+
+
+def export_job(client):
+    """One full export run as a background job, polled until it finishes; returns True on success."""
+    response = client.post("/api/v1/jobs", json={"kind": "export", "params": {"format": "csv"}})
+    if response.status_code != 202:
+        return False
+    status_url = response.headers["Location"]
+    while True:
+        job = client.get(status_url).get_json()
+        if job["status"] not in ("queued", "running"):
+            return job["status"] == "succeeded"
+        time.sleep(0.25)
+
+
+MODES = {
+    "idle": None,
+    "inline_exports": export_inline,
+    "job_exports": export_job,
+}
+
+
+def run_mode(app, export, readers, exporters, seconds):
+    """Runs readers (and exporters, unless `export` is None) for `seconds`; returns latencies."""
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies, exports = [], []
+
+    def reader():
+        client = app.test_client()
+        client.post("/login", data=CREDENTIALS)
+        while not stop.is_set():
+            start = time.perf_counter()
+            client.get("/")
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    def exporter():
+        client = app.test_client()
+        client.post("/login", data=CREDENTIALS)
+        while not stop.is_set():
+            ok = export(client)
+            with lock:
+                exports.append(ok)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    if export is not None:
+        threads += [threading.Thread(target=exporter) for _ in range(exporters)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    return {
+        "reads": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "exports": len(exports),
+        "failed_exports": exports.count(False),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=50000, help="Ledger size to seed.")
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--exporters", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each run.")
+    parser.add_argument("--workdir", help="Directory for the scratch remit.db (default: a new temporary directory).")
+    args = parser.parse_args()
+
+    config = {"DASHBOARD_CACHE_SIZE": 0, "JOB_POLL_INTERVAL_S": 0.25}
+    velocity, app = load_app(args.workdir, config)
+    db = app.extensions["velocity"].pool.connect()
+    seed_ledger(db, args.rows)
+    db.close()
+
+    results = {"benchmark": "jobs", "rows": args.rows, "readers": args.readers,
+               "exporters": args.exporters, "seconds": args.seconds}
+    for mode, export in MODES.items():
+        results[mode] = run_mode(app, export, args.readers, args.exporters, args.seconds)
+    runner = app.extensions["velocity"].job_runner
+    if runner is not None:
+        runner.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Route load test with per-route throughput and latency percentiles.
+
+Seeds a scratch ledger with benchmarks.ledger and drives the dashboard, its filters,
+the insert form, deletes and login through Flask's test client from several threads,
+or, with --url, drives a running server over HTTP. Results are printed (or written with
+--output) as JSON so runs can be compared before deploying.
+
+    python -m benchmarks.loadtest --rows 100000 --requests 200 --concurrency 8
+    python -m benchmarks.loadtest --url http://127.0.0.1:5000 --requests 500
+"""
+import argparse
+import http.cookiejar
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from benchmarks import load_app
+from benchmarks.ledger import DEFAULT_END_DATE, FIRST_NAMES, seed_ledger
+
+ROUTES = ("dashboard", "filter_name", "filter_date", "insert", "delete", "login")
+CREDENTIALS = {"username": "admin", "password": "password123"}
+
+
+class TestClientDriver:
+    """Issues requests through the Flask test client (no network, no server)."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        return self.client.open(path, method=method, data=data).status_code
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Reports redirects as responses instead of following them, like the test client."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpDriver:
+    """Issues requests to a running server, keeping the session cookie."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def route_request(route, counter, delete_ids):
+    """Returns the (method, path, form data) for the n-th request of a route."""
+    if route == "dashboard":
+        return "GET", "/", None
+    if route == "filter_name":
+        return "GET", "/?" + urllib.parse.urlencode({"filter_name": FIRST_NAMES[counter % 5]}), None
+    if route == "filter_date":
+        return "GET", f"/?filter_date={DEFAULT_END_DATE.isoformat()}", None
+    if route == "insert":
+        return "POST", "/", {"sender": f"Load Test {counter}", "recipient": "Benchmark Recipient",
+                             "amount": "250.00", "fee": "4.99", "date": DEFAULT_END_DATE.isoformat()}
+    if route == "delete":
+        return "GET", f"/delete_remittance/{delete_ids[counter % len(delete_ids)]}", None
+    return "POST", "/login", CREDENTIALS
+
+
+def run_route(make_driver, route, requests, concurrency, delete_ids):
+    """Sends `requests` requests to one route from `concurrency` logged-in workers."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        driver = make_driver()
+        driver.request("POST", "/login", CREDENTIALS)
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            method, path, data = route_request(route, n, delete_ids)
+            start = time.perf_counter()
+            status = driver.request(method, path, data)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / wall, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def fetch_delete_ids(driver, count):
+    """Collects ids of existing remittances (newest first) through the JSON API."""
+    ids, cursor = [], None
+    client = getattr(driver, "client", None)
+    while len(ids) < count:
+        path = "/api/v1/remittances?per_page=500" + (f"&after={cursor}" if cursor else "")
+        if client is not None:
+            page = client.get(path).get_json()
+        else:
+            with driver.opener.open(driver.base_url + path) as response:
+                page = json.load(response)
+        ids.extend(row["id"] for row in page["remittances"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    return ids[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10000, help="Ledger size to seed (test-client mode).")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per route.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--routes", default=",".join(ROUTES), help="Comma-separated subset of: " + ", ".join(ROUTES))
+    parser.add_argument("--url", help="Drive a running server instead of the test client.")
+    parser.add_argument("--workdir", help="Directory for the scratch remit.db (test-client mode).")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout.")
+    args = parser.parse_args()
+
+    routes = [route for route in args.routes.split(",") if route]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    if args.url:
+        make_driver = lambda: HttpDriver(args.url)  # noqa: E731
+        seeded = None
+    else:
+        _, app = load_app(args.workdir)
+        db = app.extensions["velocity"].pool.connect()
+        seed_ledger(db, args.rows)
+        db.close()
+        make_driver = lambda: TestClientDriver(app)  # noqa: E731
+        seeded = args.rows
+
+    delete_ids = []
+    if "delete" in routes:
+        driver = make_driver()
+        driver.request("POST", "/login", CREDENTIALS)
+        delete_ids = fetch_delete_ids(driver, args.requests)
+        if not delete_ids:
+            parser.error("the ledger has no remittances to delete")
+
+    results = {
+        "benchmark": "loadtest",
+        "mode": "http" if args.url else "test_client",
+        "rows": seeded,
+        "requests_per_route": args.requests,
+        "concurrency": args.concurrency,
+        "routes": {route: run_route(make_driver, route, args.requests, args.concurrency, delete_ids)
+                   for route in routes},
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Dashboard read latency under write load: reads from remit.db versus the in-memory read snapshot.
+
+Seeds a scratch ledger, then for each mode runs reader threads fetching filtered dashboard
+pages through the test client while writer processes (standing in for other workers) keep
+committing small insert batches, and once more with no writers as the baseline. The
+dashboard page cache is disabled so every read runs its queries.
+
+    python -m benchmarks.read_snapshot --rows 100000 --readers 4 --writers 2 --seconds 5
+"""
+import argparse
+import json
+import multiprocessing
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+from benchmarks import load_app
+from benchmarks.ledger import DEFAULT_END_DATE, FIRST_NAMES, seed_ledger
+from benchmarks.loadtest import CREDENTIALS, percentile
+
+MODES = {
+    "disk": {"READ_SNAPSHOT": False},
+    "snapshot": {"READ_SNAPSHOT": True},
+}
+
+
+def dashboard_paths():
+    """A rotation of dashboard queries: plain, by name, by date range and by amount band."""
+    month_start = DEFAULT_END_DATE.replace(day=1).isoformat()
+    queries = [{}] + [{"filter_name": name} for name in FIRST_NAMES[:4]] + [
+        {"date_from": month_start, "date_to": DEFAULT_END_DATE.isoformat()},
+        {"amount_min": "500", "amount_max": "750"},
+    ]
+    return ["/?" + urllib.parse.urlencode(query) for query in queries]
+
+
+def write_load(database, insert_sql, worker_id, write_batch, stop, written):
+    """Writer process: commits `write_batch` rows per transaction until `stop` is set."""
+    db = sqlite3.connect(database, timeout=30)
+    db.execute("PRAGMA synchronous = NORMAL")
+    row = (f"Writer {worker_id}", "Benchmark Recipient", 250.0, 4.99, DEFAULT_END_DATE.isoformat())
+    while not stop.is_set():
+        with db:
+            db.executemany(insert_sql, [row] * write_batch)
+        with written.get_lock():
+            written.value += write_batch
+    db.close()
+
+
+def run_mode(velocity, app, readers, writers, seconds, write_batch):
+    """Runs readers (and writers, if any) for `seconds`; returns read latency and write counts."""
+    snapshot = app.extensions["velocity"].read_snapshot
+    if snapshot is not None:
+        snapshot.refresh()
+    paths = dashboard_paths()
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies, errors = [], []
+    context = multiprocessing.get_context("spawn")
+    stop_writers = context.Event()
+    written = context.Value("q", 0)
+
+    def reader(offset):
+        client = app.test_client()
+        client.post("/login", data=CREDENTIALS)
+        n = offset
+        while not stop.is_set():
+            start = time.perf_counter()
+            status = client.get(paths[n % len(paths)]).status_code
+            elapsed = time.perf_counter() - start
+            n += 1
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors.append(status)
+
+    processes = [context.Process(target=write_load, args=(
+        app.config["DATABASE"], velocity.INSERT_REMITTANCE_SQL, n, write_batch, stop_writers, written))
+        for n in range(writers)]
+    for p in processes:
+        p.start()
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    stop_writers.set()
+    for t in threads:
+        t.join()
+    for p in processes:
+        p.join()
+    if snapshot is not None:
+        snapshot.stop()
+
+    latencies.sort()
+    result = {
+        "reads": len(latencies),
+        "errors": len(errors),
+        "reads_per_s": round(len(latencies) / seconds, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "rows_written": written.value,
+    }
+    if snapshot is not None:
+        result.update(snapshot_reads=snapshot.hits, disk_reads=snapshot.misses, refreshes=snapshot.refreshes)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=50000, help="Ledger size to seed.")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--write-batch", type=int, default=10, help="Rows per write transaction.")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each run.")
+    parser.add_argument("--interval", type=float, default=1.0, help="READ_SNAPSHOT_INTERVAL_S.")
+    parser.add_argument("--workdir", help="Directory for the scratch remit.db (default: a new temporary directory).")
+    args = parser.parse_args()
+
+    common = {"DASHBOARD_CACHE_SIZE": 0, "READ_SNAPSHOT_INTERVAL_S": args.interval,
+              "READ_SNAPSHOT_MAX_STALENESS_S": max(5.0, args.interval * 5)}
+    velocity, app = load_app(args.workdir, common)
+    db = app.extensions["velocity"].pool.connect()
+    seed_ledger(db, args.rows)
+    db.close()
+
+    results = {"benchmark": "read_snapshot", "rows": args.rows, "readers": args.readers,
+               "writers": args.writers, "write_batch": args.write_batch, "seconds": args.seconds}
+    for mode, config in MODES.items():
+        for writers in (0, args.writers):
+            mode_app = velocity.create_app(dict(common, **config))
+            key = f"{mode}_{'idle' if writers == 0 else 'under_writes'}"
+            results[key] = run_mode(velocity, mode_app, args.readers, writers, args.seconds, args.write_batch)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
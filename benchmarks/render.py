@@ -0,0 +1,80 @@
+"""
+Micro-benchmark of per-request dashboard rendering.
+
+Compares the old approach (render_template_string on BASE_CSS + template source, which
+re-parses and recompiles the template on every call) with the precompiled, named template
+that links the fingerprinted stylesheet.
+
+    python -m benchmarks.render --iterations 2000 --rows 50
+"""
+import argparse
+import json
+import time
+
+from flask import render_template, render_template_string, session
+
+from benchmarks import load_app
+
+
+def sample_context(rows):
+    """Builds a dashboard template context with `rows` remittances."""
+    remittances = [
+        {"id": i, "sender": f"Sender {i}", "recipient": f"Recipient {i}",
+         "amount": 100.0 + i, "fee": 2.5, "date": "2025-01-01"}
+        for i in range(rows)
+    ]
+    return {
+        "filtered_remittances": remittances,
+        "all_remits_count": rows * 10,
+        "total_fees": rows * 2.5,
+        "next_url": "/?after=2025-01-01_1",
+        "prev_url": None,
+        "export_url": "/export",
+        "leaderboards": {"senders": [], "corridors": []},
+        "month": "2025-01",
+        "today": "2025-01-01",
+    }
+
+
+def time_render(render, iterations):
+    """Returns (mean microseconds per render, bytes per response)."""
+    body = render()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        render()
+    elapsed = time.perf_counter() - start
+    return elapsed / iterations * 1e6, len(body.encode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=50, help="Remittance rows on the rendered page.")
+    args = parser.parse_args()
+
+    velocity, app = load_app()
+    context = sample_context(args.rows)
+    # Reconstructs the pre-change template: stylesheet inlined, compiled from a string per call
+    inline_source = "<style>" + velocity.BASE_CSS + "</style>" + velocity.REMITTANCE_TRACKER_TEMPLATE
+
+    with app.test_request_context("/"):
+        session["username"] = "benchmark"
+        before_us, before_bytes = time_render(
+            lambda: render_template_string(inline_source, **context), args.iterations)
+        after_us, after_bytes = time_render(
+            lambda: render_template("velocity/remittance_tracker.html", **context), args.iterations)
+
+    print(json.dumps({
+        "benchmark": "render",
+        "iterations": args.iterations,
+        "rows": args.rows,
+        "inline_string_us": round(before_us, 1),
+        "inline_string_bytes": before_bytes,
+        "precompiled_us": round(after_us, 1),
+        "precompiled_bytes": after_bytes,
+        "speedup": round(before_us / after_us, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Cold-start time of a worker process: import, create_app() and the first request.
+
+Each run is a fresh interpreter against an already migrated scratch database, timed as
+a worker now starts (schema left to `flask migrate`), the same without precompiling the
+templates, and as it used to (running the schema migration itself before serving).
+Medians are reported in milliseconds.
+
+    python -m benchmarks.startup --runs 15 --rows 10000
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks import load_app
+from benchmarks.ledger import seed_ledger
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+MODES = {
+    # name: (run the migration in the worker, precompile templates)
+    "lazy": (False, True),
+    "lazy_templates": (False, False),
+    "migrate_on_start": (True, True),
+}
+
+
+def child(migrate, precompile):
+    """Starts the app in this process and prints its startup phases as JSON."""
+    started = time.perf_counter()
+    velocity = importlib.import_module("app")
+    imported = time.perf_counter()
+    app = velocity.create_app({"PRECOMPILE_TEMPLATES": precompile})
+    created = time.perf_counter()
+    if migrate:
+        with app.app_context():
+            velocity.run_migrations()
+    migrated = time.perf_counter()
+    status = app.test_client().get("/login").status_code
+    served = time.perf_counter()
+    print(json.dumps({
+        "status": status,
+        "import_ms": (imported - started) * 1000,
+        "create_app_ms": (created - imported) * 1000,
+        "migrate_ms": (migrated - created) * 1000,
+        "first_request_ms": (served - migrated) * 1000,
+        "import_to_first_request_ms": (served - started) * 1000,
+    }))
+
+
+def run_children(workdir, runs, migrate, precompile):
+    """Runs `runs` fresh processes; returns the median of each phase (plus process wall time)."""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    command = [sys.executable, "-m", "benchmarks.startup", "--child"]
+    command += (["--migrate"] if migrate else []) + ([] if precompile else ["--no-precompile"])
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run(command, cwd=workdir, env=env, check=True, capture_output=True, text=True).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        sample["process_wall_ms"] = (time.perf_counter() - start) * 1000
+        if sample.pop("status") != 200:
+            raise SystemExit("the first request did not succeed")
+        samples.append(sample)
+    return {key: round(statistics.median(s[key] for s in samples), 2) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=15, help="Processes started per mode.")
+    parser.add_argument("--rows", type=int, default=10000, help="Ledger size to seed.")
+    parser.add_argument("--workdir", help="Directory for the scratch remit.db (default: a new temporary directory).")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--migrate", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--no-precompile", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.migrate, not args.no_precompile)
+        return
+
+    _, app = load_app(args.workdir)
+    db = app.extensions["velocity"].pool.connect()
+    seed_ledger(db, args.rows)
+    db.close()
+    workdir = os.getcwd()
+
+    results = {"benchmark": "startup", "runs": args.runs, "rows": args.rows}
+    for mode, (migrate, precompile) in MODES.items():
+        results[mode] = run_children(workdir, args.runs, migrate, precompile)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Large dashboard pages: rendered whole versus streamed (and compressed) while they are read.
+
+Seeds a scratch ledger and fetches one large dashboard page per request through the test
+client, reading the body chunk by chunk as a browser would. For each mode it reports the
+median time to the first chunk and to the whole page, the bytes sent, and the peak Python
+memory allocated while serving one page (measured in a separate pass with tracemalloc).
+
+    python -m benchmarks.stream --rows 50000 --per-page 5000 --requests 10
+"""
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+
+from benchmarks import load_app
+from benchmarks.ledger import seed_ledger
+from benchmarks.loadtest import CREDENTIALS
+
+MODES = {
+    # name: (config, Accept-Encoding)
+    "buffered": ({"STREAM_MIN_ROWS": 0}, "identity"),
+    "streamed": ({}, "identity"),
+    "streamed_gzip": ({}, "gzip"),
+    "streamed_br": ({}, "br"),
+}
+
+
+def fetch(client, path, encoding):
+    """Requests `path` and reads it chunk by chunk; returns (first chunk s, total s, bytes)."""
+    start = time.perf_counter()
+    response = client.get(path, headers={"Accept-Encoding": encoding}, buffered=False)
+    first, size = None, 0
+    for chunk in response.response:
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    response.close()
+    return first, time.perf_counter() - start, size
+
+
+def run_mode(app, path, encoding, requests):
+    client = app.test_client()
+    client.post("/login", data=CREDENTIALS)
+    fetch(client, path, encoding)  # warm the page cache and the template
+    samples = [fetch(client, path, encoding) for _ in range(requests)]
+
+    tracemalloc.start()
+    fetch(client, path, encoding)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "first_chunk_ms": round(statistics.median(s[0] for s in samples) * 1000, 2),
+        "total_ms": round(statistics.median(s[1] for s in samples) * 1000, 2),
+        "bytes_sent": samples[0][2],
+        "peak_alloc_kb": round(peak / 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=50000, help="Ledger size to seed.")
+    parser.add_argument("--per-page", type=int, default=5000, help="Rows on the page.")
+    parser.add_argument("--requests", type=int, default=10, help="Timed requests per mode.")
+    parser.add_argument("--workdir", help="Directory for the scratch remit.db (default: a new temporary directory).")
+    args = parser.parse_args()
+
+    common = {"DASHBOARD_CACHE_SIZE": 0, "MAX_PAGE_SIZE": args.per_page, "STREAM_MAX_PAGE_SIZE": args.per_page}
+    velocity, app = load_app(args.workdir, common)
+    db = app.extensions["velocity"].pool.connect()
+    seed_ledger(db, args.rows)
+    db.close()
+
+    path = f"/?per_page={args.per_page}"
+    results = {"benchmark": "stream", "rows": args.rows, "per_page": args.per_page, "requests": args.requests}
+    for mode, (config, encoding) in MODES.items():
+        if encoding == "br" and velocity.brotli is None:
+            continue
+        mode_app = velocity.create_app(dict(common, **config))
+        results[mode] = run_mode(mode_app, path, encoding, args.requests)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
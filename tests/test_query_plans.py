@@ -0,0 +1,70 @@
+"""
+History and export queries must stay bounded: no plan may scan the whole remittances table,
+and a history page may only sort rows when a probe found few of them. The fixture ledger is
+small, so the probes are scaled down to make both of their choices reachable.
+"""
+import pytest
+
+import app as velocity
+
+SAMPLES = {
+    'filter_name': "maria", 'filter_date': "2025-01-15",
+    'date_from': "2025-01-01", 'date_to': "2025-01-31",
+    'amount_min': 100.0, 'amount_max': 500.0,
+}
+DATE_HINT = " INDEXED BY idx_remittances_date_id_amount"
+AMOUNT_HINT = " INDEXED BY idx_remittances_amount_date"
+
+
+@pytest.fixture
+def app(tmp_path):
+    application = velocity.create_app({
+        "DATABASE": str(tmp_path / "remit.db"),
+        "NAME_INDEX_PROBE_ROWS": 10,
+        "AMOUNT_INDEX_PROBE_ROWS": 10,
+    })
+    with application.app_context():
+        velocity.run_migrations()
+        db = velocity.get_db()
+        rows = [("Maria Santos", "Jose Cruz", 100.0 + day * 10, 2.5, f"2025-01-{day:02d}") for day in range(1, 31)]
+        rows += [("Zed Quill", "Maria Santos", 9000.0, 50.0, "2025-01-15"), ("Zed Quill", "Ana Tan", 9001.0, 50.0, "2025-01-16")]
+        with db:
+            db.executemany(velocity.INSERT_REMITTANCE_SQL, rows)
+        yield application
+
+
+def test_history_query_plans_are_bounded(app):
+    with app.app_context():
+        failures = [
+            (kind, filters, problems)
+            for kind, filters, _, plan in velocity.iter_history_query_plans(velocity.get_db(), SAMPLES)
+            for problems in [velocity.query_plan_problems(kind, plan)]
+            if problems
+        ]
+    assert failures == []
+
+
+@pytest.mark.parametrize("filters, hint", [
+    ({'filter_name': "maria"}, DATE_HINT),
+    ({'filter_name': "zed"}, ""),
+    ({'amount_min': 100.0, 'amount_max': 500.0}, DATE_HINT),
+    ({'amount_min': 8000.0}, AMOUNT_HINT),
+    ({'filter_date': "2025-01-15", 'amount_min': 8000.0}, ""),
+])
+def test_probes_pick_the_date_walk_only_for_broad_filters(app, filters, hint):
+    with app.app_context():
+        assert velocity.choose_history_index(velocity.get_db().cursor(), filters) == hint
+
+
+def test_query_plan_problems_flags_scans_and_unprobed_sorts():
+    sorted_page = ["SEARCH remittances USING INDEX idx_remittances_amount_date (amount>? AND amount<?)",
+                   "USE TEMP B-TREE FOR ORDER BY"]
+    assert velocity.query_plan_problems("page", sorted_page)
+    assert not velocity.query_plan_problems("probed page", sorted_page)
+    assert velocity.query_plan_problems("export", ["SCAN remittances"])
+    assert not velocity.query_plan_problems("page", ["SCAN remittances USING INDEX idx_remittances_date_id_amount"])
+
+
+def test_check_query_plans_command(app):
+    result = app.test_cli_runner().invoke(args=["check-query-plans"])
+    assert result.exit_code == 0, result.output